@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+БЕНЧМАРК ЛОГИРОВАНИЯ НА ПУТИ ЗАПРОСА
+Сравнивает накладные расходы на один запрос регистрации. Запрос проходит
+через минимальное ASGI-приложение, чтобы учесть и стоимость middleware:
+  до    - print() с эмодзи, как раньше в register_user, и строка access log
+          uvicorn (stdout без буфера, синхронно в цикле событий)
+  после - RequestContextMiddleware + JSON через очередь и фоновый поток,
+          access log uvicorn отключен (--no-access-log)
+
+Запуск:
+    python bench_logging.py --requests 20000 --output /tmp/bench.log
+    python bench_logging.py --write-latency-us 200   # stdout, который не успевает читаться
+
+На быстром файле print() дешевле (нет форматирования JSON); выигрыш
+появляется, когда запись в stdout блокируется - тогда ее ждет уже не запрос.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+import logging_config
+
+
+class SlowStream:
+    """Поток с задержкой на каждую запись - имитирует stdout в Docker под нагрузкой"""
+
+    def __init__(self, stream, latency_us: int):
+        self.stream = stream
+        self.latency = latency_us / 1_000_000
+
+    def write(self, data: str) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def print_request(out, i: int):
+    """Старый вариант: два синхронных print() на запрос"""
+    print(f"📝 Регистрация пользователя: Иван Петров{i}", file=out, flush=True)
+    print(f"✅ Пользователь зарегистрирован: ivan{i} (ID: {i})", file=out, flush=True)
+
+
+def logging_request(logger, i: int):
+    """Новый вариант: те же события через структурированный логгер"""
+    logger.info("Регистрация пользователя", extra={"nickname": f"ivan{i}", "sampled": True})
+    logger.info("Пользователь зарегистрирован", extra={"nickname": f"ivan{i}", "user_id": i})
+
+
+def access_log_app(app, out):
+    """Строка access log после ответа - как uvicorn.access с access_log=True"""
+    logger = logging.getLogger("bench.uvicorn.access")
+    handler = logging.StreamHandler(out)
+    handler.setFormatter(logging.Formatter('%(levelname)s:     %(message)s'))
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    async def wrapped(scope, receive, send):
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        await app(scope, receive, send_with_status)
+        logger.info('%s - "%s %s HTTP/1.1" %d', "127.0.0.1:50000", scope["method"], scope["path"], status)
+    return wrapped
+
+
+def asgi_app(handler):
+    """Минимальное ASGI-приложение: вызывает handler и отдает пустой ответ 200"""
+    async def app(scope, receive, send):
+        handler(scope["bench_i"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return app
+
+
+async def _measure_asgi(app, requests: int) -> list:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    timings = []
+    for i in range(requests):
+        scope = {"type": "http", "method": "POST", "path": "/api/user/register",
+                 "headers": [], "bench_i": i}
+        started = time.perf_counter_ns()
+        await app(scope, receive, send)
+        timings.append(time.perf_counter_ns() - started)
+    return timings
+
+
+def measure(app, requests: int) -> list:
+    return asyncio.run(_measure_asgi(app, requests))
+
+
+def report(title: str, timings: list):
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"   {title:<28} среднее {statistics.mean(timings) / 1000:8.2f} мкс"
+          f"   медиана {statistics.median(timings) / 1000:8.2f} мкс   p99 {p99 / 1000:8.2f} мкс")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Накладные расходы логирования на запрос")
+    parser.add_argument("--requests", type=int, default=20_000, help="количество имитируемых запросов")
+    parser.add_argument("--output", default=os.devnull,
+                        help="куда писать логи (файл или pipe; по умолчанию /dev/null)")
+    parser.add_argument("--write-latency-us", type=int, default=0,
+                        help="задержка на каждую запись в поток, мкс (медленный потребитель stdout)")
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="LOG_SAMPLE_RATE для варианта 'после'")
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print(f"⏱️  ЛОГИРОВАНИЕ: {args.requests:,} запросов -> {args.output}, "
+          f"задержка записи {args.write_latency_us} мкс")
+    print("=" * 60)
+
+    # buffering=1 - построчный сброс, как stdout при PYTHONUNBUFFERED=1
+    with open(args.output, "w", encoding="utf-8", buffering=1) as raw:
+        out = SlowStream(raw, args.write_latency_us)
+        before = measure(access_log_app(asgi_app(lambda i: print_request(out, i)), out), args.requests)
+
+        logger = logging_config.setup_logging(level="INFO", sample_rate=args.sample_rate, stream=out)
+        after = measure(
+            logging_config.RequestContextMiddleware(asgi_app(lambda i: logging_request(logger, i))),
+            args.requests,
+        )
+
+        # Время на дописывание очереди в запрос не входит - это работа фонового потока
+        drain_started = time.perf_counter()
+        logging_config.shutdown_logging()
+        drain = time.perf_counter() - drain_started
+
+    report("до (print + access log)", before)
+    report("после (middleware + очередь)", after)
+    print(f"\n   Фоновый поток дописал очередь за {drain * 1000:.1f} мс")
+    print(f"   Отношение медиан до/после: x{statistics.median(before) / statistics.median(after):.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
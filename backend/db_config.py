@@ -5,6 +5,10 @@
 
 import pyodbc
 
+from logging_config import get_logger
+
+logger = get_logger("db")
+
 class DatabaseConfig:
     """Конфигурация подключения к SQL Server"""
     
@@ -23,7 +27,7 @@ class DatabaseConfig:
             conn = pyodbc.connect(cls.CONNECTION_STRING)
             return conn
         except Exception as e:
-            print(f"❌ Ошибка подключения: {e}")
+            logger.error("Ошибка подключения к БД: %s", e)
             return None
 
 def get_db_connection():
@@ -0,0 +1,202 @@
+"""
+СТРУКТУРИРОВАННОЕ ЛОГИРОВАНИЕ
+JSON-строки, запись в stdout из фонового потока (QueueHandler/QueueListener),
+request_id для связи событий одного запроса, сэмплирование частых
+INFO-событий и смена уровня логирования во время работы.
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+LOGGER_NAME = "nfp"
+
+# request_id текущего запроса (выставляется middleware в main.py)
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Стандартные атрибуты LogRecord - все остальное считаем полями события
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "request_id", "sampled"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на событие; вызывается уже в фоновом потоке"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            event["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                event[key] = value
+        if record.exc_text:
+            event["exception"] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет request_id; должен работать в потоке запроса, до очереди"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю событий, помеченных extra={"sampled": True}, уровня INFO и ниже"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который оставляет форматирование фоновому потоку"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Подставляем аргументы и трейсбек сейчас - объекты могут измениться
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_sampling_filter = SamplingFilter()
+_setup_lock = threading.Lock()
+
+
+def setup_logging(level: Optional[str] = None, sample_rate: Optional[float] = None, stream=None) -> logging.Logger:
+    """Настраивает логгер приложения; повторный вызов ничего не делает"""
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _setup_lock:
+        if _listener is not None:
+            return logger
+
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(JsonFormatter())
+
+        _sampling_filter.rate = float(sample_rate if sample_rate is not None else os.getenv("LOG_SAMPLE_RATE", "1.0"))
+        handler = _QueueHandler(queue.SimpleQueue())
+        handler.addFilter(_sampling_filter)
+        handler.addFilter(ContextFilter())
+
+        logger.handlers[:] = [handler]
+        logger.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(handler.queue, writer)
+        _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    """Дописывает очередь и останавливает фоновый поток"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: Optional[str] = None) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def set_log_level(level: str, name: Optional[str] = None) -> str:
+    """Меняет уровень логгера во время работы; ValueError при неизвестном уровне"""
+    get_logger(name).setLevel(level.upper())
+    return logging.getLevelName(get_logger(name).getEffectiveLevel())
+
+
+def set_sample_rate(rate: float):
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError("sample_rate должен быть от 0 до 1")
+    _sampling_filter.rate = rate
+
+
+class RequestContextMiddleware:
+    """ASGI middleware: request_id для событий запроса и сэмплируемая запись о нем.
+
+    Написан на чистом ASGI, без BaseHTTPMiddleware: тот оборачивает каждый
+    запрос в отдельную задачу и потоки памяти, что заметно на коротких запросах.
+    """
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = get_logger("http")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (self.header, request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            # Частое событие - пишется с сэмплированием (LOG_SAMPLE_RATE)
+            self.logger.info("Запрос обработан", extra={
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "sampled": True,
+            })
+            request_id_var.reset(token)
+
+
+def logging_info() -> dict:
+    logger = get_logger()
+    return {
+        "level": logging.getLevelName(logger.getEffectiveLevel()),
+        "sample_rate": _sampling_filter.rate,
+        "loggers": {
+            name: logging.getLevelName(l.level)
+            for name, l in logging.Logger.manager.loggerDict.items()
+            if name.startswith(f"{LOGGER_NAME}.") and isinstance(l, logging.Logger) and l.level
+        },
+    }
@@ -1,14 +1,39 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import uvicorn
+import pyodbc
 import random
+import re
+import os
+import secrets
 from datetime import datetime, timezone, timedelta
 from contextlib import contextmanager
 
 # Импортируем нашу конфигурацию БД
 from db_config import DatabaseConfig, get_db_connection
+import queries
+from logging_config import (
+    setup_logging, shutdown_logging, get_logger, RequestContextMiddleware,
+    set_log_level, set_sample_rate, logging_info
+)
+from reference_cache import reference_cache
+from party_index import (
+    PartyRow, db_clock, party_search_conditions, party_search_query, upcoming_parties_index
+)
+
+# Логи пишутся в stdout фоновым потоком, а не print() в обработчиках
+setup_logging()
+logger = get_logger("api")
+
+# Роль, назначаемая при регистрации
+DEFAULT_ROLE = "Участник"
+
+DUPLICATE_USER_DETAIL = "Пользователь с таким nickname или email уже существует"
+
+# Сколько раз пробуем новый реферальный код при совпадении (UX_users_refer)
+REFER_CODE_ATTEMPTS = 5
 
 # ============== FASTAPI APP ==============
 app = FastAPI(
@@ -32,6 +57,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ============== ЛОГИРОВАНИЕ ЗАПРОСОВ ==============
+# request_id для всех событий запроса (из X-Request-ID или новый)
+app.add_middleware(RequestContextMiddleware)
+
+# ============== СПРАВОЧНИКИ ==============
+@app.on_event("startup")
+async def load_reference_cache():
+    """Загрузка справочников (роли, города, схема) при старте"""
+    reference_cache.start()
+    reference_cache.install_signal_handler()
+
+@app.on_event("shutdown")
+async def stop_reference_cache():
+    reference_cache.stop()
+
+# Регистрируется последним: обработчики shutdown вызываются по порядку,
+# и предупреждения остановки кэша должны попасть в лог до остановки очереди
+@app.on_event("shutdown")
+async def flush_logs():
+    shutdown_logging()
+
 # ============== МОДЕЛИ ДАННЫХ ==============
 class UserRegister(BaseModel):
     name: str
@@ -62,8 +108,12 @@ class Party(BaseModel):
     price: str
 
 # ============== УТИЛИТЫ ==============
-def generate_referral_code(name: str) -> str:
-    """Генерация реферального кода: ддммггггччммсс + 2 буквы (GMT+7)"""
+def generate_referral_code(name: str, attempt: int = 0) -> str:
+    """Генерация реферального кода: ддммггггччммсс + 2 буквы (GMT+7)
+
+    attempt > 0 - повтор после совпадения кода: буквы берутся из всего алфавита,
+    т.к. у имени их может быть всего пара вариантов.
+    """
     gmt7 = timezone(timedelta(hours=7))
     now = datetime.now(gmt7)
     datetime_part = now.strftime("%d%m%Y%H%M%S")
@@ -79,7 +129,9 @@ def generate_referral_code(name: str) -> str:
                 letters.append(ru_to_lat[char])
     
     # Формируем буквенную часть
-    if len(letters) >= 2:
+    if attempt > 0:
+        name_part = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=2))
+    elif len(letters) >= 2:
         name_part = ''.join(random.sample(letters, 2))
     elif len(letters) == 1:
         name_part = letters[0] + random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
@@ -88,6 +140,28 @@ def generate_referral_code(name: str) -> str:
     
     return f"{datetime_part}{name_part}"
 
+def duplicate_key_index(error: Exception) -> Optional[str]:
+    """Имя индекса/ограничения из ошибки SQL Server 2601/2627, иначе None"""
+    # pyodbc: args = (SQLSTATE, текст); нативный код стоит после текста
+    # сообщения: "... The duplicate key value is (x). (2601) (SQLExecDirectW)",
+    # поэтому цифры в самом значении ключа не считаются
+    message = error.args[1] if len(error.args) > 1 else str(error)
+    if not re.search(r"\((2601|2627)\)\s*(?:\(SQL\w+\)|;|$)", message):
+        return None
+    match = re.search(r"(?:index|constraint) '([^']+)'", message)
+    return match.group(1) if match else ""
+
+def encode_party_cursor(party: PartyRow) -> str:
+    """Курсор keyset-пагинации: start_party|ID последней строки страницы"""
+    return f"{party.start_party.isoformat()}|{party.id}"
+
+def decode_party_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        start_party, party_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(start_party), int(party_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
 # ============== API ЭНДПОИНТЫ ==============
 
 @app.get("/")
@@ -107,7 +181,7 @@ async def health_check():
         conn = get_db_connection()
         if conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT @@version")
+            cursor.execute(queries.SELECT_VERSION)
             db_version = cursor.fetchone()[0]
             conn.close()
             db_status = "connected"
@@ -143,19 +217,17 @@ async def test_database():
         
         cursor = conn.cursor()
         
-        # Проверяем таблицы
-        cursor.execute("""
-            SELECT TABLE_NAME 
-            FROM INFORMATION_SCHEMA.TABLES 
-            WHERE TABLE_TYPE = 'BASE TABLE'
-            ORDER BY TABLE_NAME
-        """)
-        tables = [row[0] for row in cursor.fetchall()]
+        # Таблицы берем из кэша справочников; пока он не загружен - из БД
+        if reference_cache.is_loaded:
+            tables = reference_cache.tables()
+        else:
+            cursor.execute(queries.SELECT_TABLES)
+            tables = [row[0] for row in cursor.fetchall()]
         
         # Проверяем пользователей
         user_count = 0
         if 'users' in [t.lower() for t in tables]:
-            cursor.execute("SELECT COUNT(*) FROM users")
+            cursor.execute(queries.COUNT_USERS)
             user_count = cursor.fetchone()[0]
         
         conn.close()
@@ -180,10 +252,7 @@ async def test_database():
 @app.post("/api/user/register", response_model=dict)
 async def register_user(user: UserRegister):
     """Регистрация нового пользователя"""
-    print(f"📝 Регистрация пользователя: {user.name} {user.surname}")
-    
-    # Генерируем реферальный код
-    refer_code = generate_referral_code(user.name)
+    logger.info("Регистрация пользователя", extra={"nickname": user.nickname, "sampled": True})
     
     conn = None
     try:
@@ -194,81 +263,76 @@ async def register_user(user: UserRegister):
         cursor = conn.cursor()
         
         # 1. Проверяем уникальность nickname и email
-        cursor.execute("""
-            SELECT ID FROM users 
-            WHERE nickname = ? OR mail = ?
-        """, (user.nickname, user.email))
+        cursor.execute(queries.SELECT_USER_BY_NICKNAME_OR_MAIL, (user.nickname, user.email))
         
         if cursor.fetchone():
             raise HTTPException(
                 status_code=400,
-                detail="Пользователь с таким nickname или email уже существует"
+                detail=DUPLICATE_USER_DETAIL
             )
         
         # 2. Проверяем реферальный код (если указан)
         refer_from_id = None
         if user.refer_from and user.refer_from.strip():
-            cursor.execute("""
-                SELECT ID FROM users WHERE refer = ?
-            """, (user.refer_from.strip(),))
+            cursor.execute(queries.SELECT_USER_BY_REFER, (user.refer_from.strip(),))
             result = cursor.fetchone()
             if result:
                 refer_from_id = result[0]
         
-        # 3. Вставляем пользователя
-        query = """
-            INSERT INTO users (
-                nickname, surname, name, age, is_verificated, is_ban,
-                phone_number, mail, refer, refer_from, gender, invited_count
-            ) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        
-        params = (
-            user.nickname,
-            user.surname,
-            user.name,
-            18,      # возраст по умолчанию
-            0,       # не верифицирован
-            0,       # не забанен
-            None,    # телефон
-            user.email,
-            refer_code,
-            user.refer_from if refer_from_id else None,
-            1,       # gender (1 - мужской)
-            0        # invited_count по умолчанию
-        )
-        
-        cursor.execute(query, params)
+        # 3. Вставляем пользователя (код уникален по UX_users_refer - при совпадении генерируем новый)
+        for attempt in range(REFER_CODE_ATTEMPTS):
+            refer_code = generate_referral_code(user.name, attempt)
+            params = (
+                user.nickname,
+                user.surname,
+                user.name,
+                18,      # возраст по умолчанию
+                0,       # не верифицирован
+                0,       # не забанен
+                None,    # телефон
+                user.email,
+                refer_code,
+                user.refer_from if refer_from_id else None,
+                1,       # gender (1 - мужской)
+                0        # invited_count по умолчанию
+            )
+            
+            try:
+                cursor.execute(queries.INSERT_USER, params)
+                break
+            except pyodbc.IntegrityError as e:
+                index = duplicate_key_index(e)
+                # nickname/mail заняли между проверкой и вставкой - тот же ответ, что и в п.1
+                if index in ("UX_users_nickname", "UX_users_mail"):
+                    raise HTTPException(status_code=400, detail=DUPLICATE_USER_DETAIL)
+                if index != "UX_users_refer" or attempt == REFER_CODE_ATTEMPTS - 1:
+                    raise
+                logger.info("Реферальный код занят, генерируем новый", extra={"attempt": attempt + 1})
         
         # 4. Получаем ID нового пользователя
-        cursor.execute("SELECT @@IDENTITY")
+        cursor.execute(queries.SELECT_LAST_IDENTITY)
         new_user_id = cursor.fetchone()[0]
         
         # 5. Назначаем роль "Участник" если таблица user_role существует
         try:
-            cursor.execute("SELECT ID FROM roles WHERE name = 'Участник'")
-            role_result = cursor.fetchone()
-            
-            if role_result:
-                # Проверяем существует ли таблица user_role
-                cursor.execute("""
-                    IF OBJECT_ID('user_role', 'U') IS NOT NULL
-                    BEGIN
-                        INSERT INTO user_role (id_user, id_role) 
-                        VALUES (?, ?)
-                    END
-                """, (new_user_id, role_result[0]))
+            if reference_cache.is_loaded:
+                role_id = reference_cache.role_id(DEFAULT_ROLE)
+                
+                if role_id is not None and reference_cache.table_exists('user_role'):
+                    cursor.execute(queries.INSERT_USER_ROLE, (new_user_id, role_id))
+            else:
+                # Кэш еще не загружен (фоновый поток повторит) - как раньше, через БД
+                cursor.execute(queries.SELECT_ROLE_BY_NAME, (DEFAULT_ROLE,))
+                role_result = cursor.fetchone()
+                
+                if role_result:
+                    cursor.execute(queries.INSERT_USER_ROLE_IF_TABLE_EXISTS, (new_user_id, role_result[0]))
         except Exception as role_error:
-            print(f"⚠️ Ошибка назначения роли: {role_error}. Продолжаем...")
+            logger.warning("Ошибка назначения роли, продолжаем: %s", role_error)
         
         # 6. Увеличиваем счетчик пригласившего (если есть)
         if refer_from_id:
-            cursor.execute("""
-                UPDATE users 
-                SET invited_count = ISNULL(invited_count, 0) + 1 
-                WHERE ID = ?
-            """, (refer_from_id,))
+            cursor.execute(queries.INCREMENT_INVITED_COUNT, (refer_from_id,))
         
         conn.commit()
         
@@ -283,7 +347,7 @@ async def register_user(user: UserRegister):
                 "nickname": user.nickname,
                 "email": user.email,
                 "refer": refer_code,
-                "current_rank": "Участник",
+                "current_rank": DEFAULT_ROLE,
                 "visits_count": 0,
                 "invited_count": 0,
                 "total_bar_spent": 0,
@@ -291,7 +355,7 @@ async def register_user(user: UserRegister):
             }
         }
         
-        print(f"✅ Пользователь зарегистрирован: {user.nickname} (ID: {new_user_id})")
+        logger.info("Пользователь зарегистрирован", extra={"nickname": user.nickname, "user_id": new_user_id})
         return response_data
         
     except HTTPException:
@@ -299,7 +363,7 @@ async def register_user(user: UserRegister):
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"❌ Ошибка регистрации: {e}")
+        logger.exception("Ошибка регистрации", extra={"nickname": user.nickname})
         raise HTTPException(
             status_code=500, 
             detail=f"Ошибка при регистрации: {str(e)}"
@@ -316,18 +380,7 @@ async def get_users(limit: int = 10, offset: int = 0):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Используем CAST для поля name в таблице roles
-        cursor.execute("""
-            SELECT 
-                u.ID, u.nickname, u.name, u.surname, u.mail, u.refer,
-                CAST(r.name AS NVARCHAR(255)) as current_rank,
-                ISNULL(u.invited_count, 0) as invited_count
-            FROM users u
-            LEFT JOIN user_role ur ON u.ID = ur.id_user
-            LEFT JOIN roles r ON ur.id_role = r.ID
-            ORDER BY u.ID DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-        """, (offset, limit))
+        cursor.execute(queries.SELECT_USERS_PAGE, (offset, limit))
         
         columns = [column[0] for column in cursor.description]
         users = []
@@ -350,26 +403,9 @@ async def get_parties(upcoming: bool = True):
         cursor = conn.cursor()
         
         if upcoming:
-            cursor.execute("""
-                SELECT 
-                    ID, name, cost, location, 
-                    CONVERT(VARCHAR, start_party, 104) as date,
-                    CONVERT(VARCHAR, start_party, 108) as time,
-                    count_seats
-                FROM parties 
-                WHERE start_party > GETDATE()
-                ORDER BY start_party ASC
-            """)
+            cursor.execute(queries.SELECT_PARTIES_UPCOMING)
         else:
-            cursor.execute("""
-                SELECT 
-                    ID, name, cost, location, 
-                    CONVERT(VARCHAR, start_party, 104) as date,
-                    CONVERT(VARCHAR, start_party, 108) as time,
-                    count_seats
-                FROM parties 
-                ORDER BY start_party DESC
-            """)
+            cursor.execute(queries.SELECT_PARTIES_ALL)
         
         columns = [column[0] for column in cursor.description]
         parties = [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -391,6 +427,117 @@ async def get_parties(upcoming: bool = True):
             }
         ]
 
+@app.get("/api/parties/search")
+async def search_parties(
+    city: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    price_min: Optional[float] = Query(None, ge=0),
+    price_max: Optional[float] = Query(None, ge=0),
+    available: bool = False,
+    upcoming: bool = True,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Поиск вечеринок с фильтрами и keyset-пагинацией по start_party"""
+    use_memory = upcoming and upcoming_parties_index.ensure_fresh()
+    
+    after = decode_party_cursor(cursor) if cursor else None
+    
+    # В БД start_party хранится без часового пояса - приводим к времени БД
+    # (часы и пояс контейнера могут отличаться от SQL Server)
+    if any(d is not None and d.tzinfo for d in (date_from, date_to, after and after[0])):
+        if not db_clock.synced and not db_clock.sync_from_db():
+            raise HTTPException(status_code=500, detail="Ошибка подключения к БД")
+        date_from = db_clock.to_db_time(date_from) if date_from else None
+        date_to = db_clock.to_db_time(date_to) if date_to else None
+        after = (db_clock.to_db_time(after[0]), after[1]) if after else None
+    filters = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "price_min": price_min,
+        "price_max": price_max,
+        "available": available,
+        "after": after,
+    }
+    
+    # 1. Частый случай - предстоящие вечеринки - отдаем из памяти
+    if use_memory:
+        page, has_more = upcoming_parties_index.search(city=city, limit=limit, **filters)
+        source = "memory"
+    else:
+        # 2. Остальное - из БД, по индексам (id_city, start_party, ID) / (start_party, ID)
+        conditions, params = party_search_conditions(upcoming=upcoming, city=city, **filters)
+        
+        conn = None
+        try:
+            conn = get_db_connection()
+            if not conn:
+                raise HTTPException(status_code=500, detail="Ошибка подключения к БД")
+            
+            db_cursor = conn.cursor()
+            # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+            db_cursor.execute(party_search_query(conditions, top=True), [limit + 1] + params)
+            rows = [PartyRow(*row) for row in db_cursor.fetchall()]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            if conn:
+                conn.close()
+        
+        page, has_more = rows[:limit], len(rows) > limit
+        source = "database"
+    
+    return {
+        "items": [party.to_dict() for party in page],
+        "next_cursor": encode_party_cursor(page[-1]) if has_more else None,
+        "source": source
+    }
+
+# ============== АДМИНИСТРИРОВАНИЕ ==============
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Проверка токена администратора (переменная окружения ADMIN_TOKEN)"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or not secrets.compare_digest(
+        x_admin_token.encode(), admin_token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+
+@app.get("/api/admin/cache", dependencies=[Depends(require_admin)])
+async def reference_cache_info():
+    """Состояние кэша справочников"""
+    return reference_cache.info()
+
+@app.post("/api/admin/cache/refresh", dependencies=[Depends(require_admin)])
+async def refresh_reference_cache():
+    """Принудительное обновление кэша справочников"""
+    success = reference_cache.refresh()
+    return {"success": success, **reference_cache.info()}
+
+class LoggingSettings(BaseModel):
+    level: Optional[str] = None
+    logger: Optional[str] = None
+    sample_rate: Optional[float] = None
+
+@app.get("/api/admin/logging", dependencies=[Depends(require_admin)])
+async def get_logging_settings():
+    """Текущие уровни логирования и доля сэмплирования"""
+    return logging_info()
+
+@app.put("/api/admin/logging", dependencies=[Depends(require_admin)])
+async def update_logging_settings(settings: LoggingSettings):
+    """Смена уровня логирования/сэмплирования без перезапуска"""
+    try:
+        if settings.level:
+            set_log_level(settings.level, settings.logger)
+        if settings.sample_rate is not None:
+            set_sample_rate(settings.sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return logging_info()
+
 # ============== ЗАПУСК ==============
 if __name__ == "__main__":
     print("🚀 Запуск Need for Party API...")
@@ -403,5 +550,6 @@ if __name__ == "__main__":
         host="0.0.0.0", 
         port=8000, 
         log_level="info",
+        access_log=False,  # запросы логирует RequestContextMiddleware
         reload=False  # ← сначала отключите reload
     )
\ No newline at end of file
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+"""
+МИГРАЦИИ СХЕМЫ
+Применяет database/migrations/NNN_описание.sql по порядку номеров и
+записывает примененные в таблицу schema_migrations. Файл делится на
+пакеты по строкам GO; каждая миграция выполняется в своей транзакции.
+
+Запуск:
+    python migrate.py status
+    python migrate.py up                  # все новые миграции
+    python migrate.py up --target 2       # только до 002 включительно
+    python migrate.py up --verify         # планы запросов до/после каждой миграции
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from db_config import get_db_connection
+
+MIGRATIONS_DIR = Path(os.getenv(
+    "MIGRATIONS_DIR",
+    Path(__file__).resolve().parent.parent / "database" / "migrations"
+))
+
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+BATCH_SEPARATOR = re.compile(r"^\s*GO\s*$", re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+    @property
+    def batches(self) -> List[str]:
+        return [batch for batch in BATCH_SEPARATOR.split(self.sql) if batch.strip()]
+
+    def __str__(self) -> str:
+        return f"{self.version:03d}_{self.name}"
+
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Файлы миграций, отсортированные по номеру"""
+    migrations = []
+    for path in directory.glob("*.sql"):
+        match = MIGRATION_FILE.match(path.name)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), path))
+    migrations.sort(key=lambda m: m.version)
+
+    versions = [m.version for m in migrations]
+    duplicates = {v for v in versions if versions.count(v) > 1}
+    if duplicates:
+        raise ValueError(f"Повторяющиеся номера миграций: {sorted(duplicates)}")
+    return migrations
+
+
+def ensure_history_table(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        IF OBJECT_ID('schema_migrations', 'U') IS NULL
+        BEGIN
+            CREATE TABLE schema_migrations (
+                version INT NOT NULL PRIMARY KEY,
+                name NVARCHAR(255) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+                duration_ms INT NOT NULL
+            )
+        END
+    """)
+    conn.commit()
+
+
+def applied_migrations(conn) -> Dict[int, str]:
+    """version -> checksum примененных миграций"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return {version: checksum for version, checksum in cursor.fetchall()}
+
+
+def apply(conn, migration: Migration) -> float:
+    """Выполняет миграцию в транзакции и записывает ее в историю"""
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        for batch in migration.batches:
+            cursor.execute(batch)
+            # Пролистываем результаты, иначе ошибки поздних операторов пакета теряются
+            while cursor.nextset():
+                pass
+        duration = time.perf_counter() - started
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (?, ?, ?, ?)",
+            (migration.version, migration.name, migration.checksum, int(duration * 1000))
+        )
+        conn.commit()
+        return duration
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def status(conn, migrations: List[Migration]):
+    applied = applied_migrations(conn)
+    print("📋 Миграции:")
+    for migration in migrations:
+        if migration.version not in applied:
+            mark = "⏳ не применена"
+        elif applied[migration.version] != migration.checksum:
+            mark = "⚠️  применена, файл изменен после применения"
+        else:
+            mark = "✅ применена"
+        print(f"   {mark:<45} {migration}")
+    unknown = sorted(set(applied) - {m.version for m in migrations})
+    for version in unknown:
+        print(f"   ❓ в БД есть миграция {version:03d}, файла нет")
+
+
+def up(conn, migrations: List[Migration], target: Optional[int] = None,
+       verify: bool = False, report_dir: Optional[Path] = None, runs: int = 5) -> int:
+    applied = applied_migrations(conn)
+    pending = [
+        m for m in migrations
+        if m.version not in applied and (target is None or m.version <= target)
+    ]
+    if not pending:
+        print("✅ Новых миграций нет")
+        return 0
+
+    if verify:
+        # Импорт здесь: verify_plans тянет party_index, а status/up без проверки он не нужен
+        import verify_plans
+        if report_dir:
+            report_dir.mkdir(parents=True, exist_ok=True)
+
+    for migration in pending:
+        print(f"\n🔧 {migration}...")
+        if verify:
+            before = verify_plans.capture_plans(conn, runs, label=f"before {migration}")
+
+        try:
+            duration = apply(conn, migration)
+        except Exception as e:
+            print(f"   ❌ Ошибка: {e}")
+            return 1
+        print(f"   ✅ Применена за {duration:.2f} c")
+
+        if verify:
+            after = verify_plans.capture_plans(conn, runs, label=f"after {migration}")
+            print("   📊 Изменения планов:")
+            print("\n".join(verify_plans.compare_reports(before, after)) or "      нет изменений")
+            if report_dir:
+                verify_plans.save_report(before, report_dir / f"{migration}.before.json")
+                verify_plans.save_report(after, report_dir / f"{migration}.after.json")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Миграции схемы Need for Party")
+    parser.add_argument("command", choices=["status", "up"], nargs="?", default="status")
+    parser.add_argument("--target", type=int, help="применить миграции до этого номера включительно")
+    parser.add_argument("--dir", type=Path, default=MIGRATIONS_DIR, help="папка с миграциями")
+    parser.add_argument("--verify", action="store_true", help="снимать планы запросов до и после каждой миграции")
+    parser.add_argument("--report-dir", type=Path, help="куда сохранять JSON-снимки планов (с --verify)")
+    parser.add_argument("--runs", type=int, default=5, help="повторов для замера времени (с --verify)")
+    args = parser.parse_args(argv)
+
+    migrations = discover(args.dir)
+
+    conn = get_db_connection()
+    if not conn:
+        print("❌ Не удалось подключиться к БД")
+        return 1
+    try:
+        ensure_history_table(conn)
+        if args.command == "status":
+            status(conn, migrations)
+            return 0
+        return up(conn, migrations, args.target, args.verify, args.report_dir, args.runs)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
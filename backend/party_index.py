@@ -0,0 +1,267 @@
+"""
+IN-MEMORY ИНДЕКС ПРЕДСТОЯЩИХ ВЕЧЕРИНОК
+Обслуживает частый сценарий поиска (предстоящие вечеринки, по городу)
+без обращения к БД. Данные живут не дольше TTL, затем перечитываются.
+"""
+
+import itertools
+import os
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from db_config import get_db_connection
+import queries
+from logging_config import get_logger
+
+logger = get_logger("party_index")
+
+# Общий запрос для БД и для индекса: свободные места = места - проданные билеты
+PARTY_SEARCH_COLUMNS = """
+        p.ID, p.name, p.cost, p.location, p.start_party, p.count_seats, p.id_city,
+        p.count_seats - ISNULL(t.sold, 0) AS free_seats
+    FROM parties p
+    OUTER APPLY (SELECT COUNT(*) AS sold FROM tickets WHERE id_party = p.ID) t
+"""
+
+
+def party_search_query(conditions: List[str] = (), top: bool = False) -> str:
+    """SELECT для поиска; top=True добавляет TOP (?) - первым параметром идет лимит"""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return (
+        f"SELECT {'TOP (?)' if top else ''}{PARTY_SEARCH_COLUMNS}"
+        f"    {where}\n    ORDER BY p.start_party ASC, p.ID ASC"
+    )
+
+
+def party_search_conditions(
+    upcoming: bool = True,
+    city: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    available: bool = False,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> Tuple[List[str], list]:
+    """WHERE-условия и параметры для party_search_query (те же фильтры, что в matches)"""
+    # start_party IS NULL не попадает в keyset-пагинацию
+    conditions = ["p.start_party IS NOT NULL"]
+    params: list = []
+    if upcoming:
+        conditions.append("p.start_party > GETDATE()")
+    if city is not None:
+        conditions.append("p.id_city = ?")
+        params.append(city)
+    if date_from is not None:
+        conditions.append("p.start_party >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("p.start_party <= ?")
+        params.append(date_to)
+    if price_min is not None:
+        conditions.append("p.cost >= ?")
+        params.append(price_min)
+    if price_max is not None:
+        conditions.append("p.cost <= ?")
+        params.append(price_max)
+    if available:
+        conditions.append("p.count_seats - ISNULL(t.sold, 0) > 0")
+    if after is not None:
+        conditions.append("(p.start_party > ? OR (p.start_party = ? AND p.ID > ?))")
+        params.extend([after[0], after[0], after[1]])
+    return conditions, params
+
+
+class DbClock:
+    """Время SQL Server: GETDATE() и его смещение от UTC.
+
+    Бэкенд и БД могут жить на разных машинах (docker-compose), поэтому
+    "сейчас" и часовой пояс для поиска берутся у БД, а не у контейнера.
+    """
+
+    def __init__(self, max_age: int = 3600):
+        self.max_age = max_age
+        self._db_now: Optional[datetime] = None
+        self._synced_at: Optional[float] = None
+        self._offset = timedelta(0)
+
+    def sync(self, cursor):
+        cursor.execute(queries.SELECT_DB_CLOCK)
+        db_now, offset_minutes = cursor.fetchone()
+        self._offset = timedelta(minutes=offset_minutes)
+        self._db_now = db_now
+        self._synced_at = time.monotonic()
+
+    def sync_from_db(self) -> bool:
+        conn = get_db_connection()
+        if not conn:
+            return False
+        try:
+            self.sync(conn.cursor())
+            return True
+        except Exception as e:
+            logger.warning("Ошибка чтения времени БД: %s", e)
+            return False
+        finally:
+            conn.close()
+
+    @property
+    def synced(self) -> bool:
+        return self._synced_at is not None and time.monotonic() - self._synced_at < self.max_age
+
+    def now(self) -> datetime:
+        """Текущее GETDATE() по последней синхронизации"""
+        return self._db_now + timedelta(seconds=time.monotonic() - self._synced_at)
+
+    def to_db_time(self, value: datetime) -> datetime:
+        """datetime с часовым поясом -> локальное время БД без пояса"""
+        if value.tzinfo is None:
+            return value
+        return value.astimezone(timezone(self._offset)).replace(tzinfo=None)
+
+
+@dataclass(frozen=True)
+class PartyRow:
+    """Строка результата поиска"""
+
+    id: int
+    name: str
+    cost: Optional[Decimal]
+    location: str
+    start_party: datetime
+    count_seats: Optional[int]
+    id_city: Optional[int]
+    free_seats: Optional[int]
+
+    @property
+    def sort_key(self) -> Tuple[datetime, int]:
+        return (self.start_party, self.id)
+
+    def to_dict(self) -> dict:
+        # Формат как у /api/parties: дата dd.mm.yyyy (104), время hh:mi:ss (108)
+        return {
+            "ID": self.id,
+            "name": self.name,
+            "cost": self.cost,
+            "location": self.location,
+            "date": self.start_party.strftime("%d.%m.%Y"),
+            "time": self.start_party.strftime("%H:%M:%S"),
+            "start_party": self.start_party.isoformat(),
+            "count_seats": self.count_seats,
+            "id_city": self.id_city,
+            "free_seats": self.free_seats,
+        }
+
+
+def matches(
+    party: PartyRow,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    available: bool = False,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> bool:
+    """Те же условия, что и WHERE в SQL-варианте поиска (NULL не проходит сравнения)"""
+    if date_from is not None and party.start_party < date_from:
+        return False
+    if date_to is not None and party.start_party > date_to:
+        return False
+    if price_min is not None and (party.cost is None or party.cost < Decimal(str(price_min))):
+        return False
+    if price_max is not None and (party.cost is None or party.cost > Decimal(str(price_max))):
+        return False
+    if available and (party.free_seats is None or party.free_seats <= 0):
+        return False
+    if after is not None and party.sort_key <= after:
+        return False
+    return True
+
+
+class UpcomingPartiesIndex:
+    """Предстоящие вечеринки, сгруппированные по городу и отсортированные по start_party"""
+
+    def __init__(self, ttl: int = 30):
+        self.ttl = ttl
+        self._all: List[PartyRow] = []
+        self._by_city: Dict[int, List[PartyRow]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Перечитывает предстоящие вечеринки из БД"""
+        conn = get_db_connection()
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            # Время БД снимаем тем же соединением, что и данные
+            db_clock.sync(cursor)
+            cursor.execute(party_search_query(["p.start_party > GETDATE()"]))
+            parties = [PartyRow(*row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.warning("Ошибка загрузки индекса вечеринок: %s", e)
+            return False
+        finally:
+            conn.close()
+
+        by_city: Dict[int, List[PartyRow]] = {}
+        for party in parties:
+            by_city.setdefault(party.id_city, []).append(party)
+
+        with self._lock:
+            self._all = parties
+            self._by_city = by_city
+            self._loaded_at = time.monotonic()
+        return True
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def ensure_fresh(self) -> bool:
+        """True, если индекс актуален (при необходимости перечитывает его)"""
+        if self.ttl <= 0:
+            return False
+        if self._is_fresh():
+            return True
+        # Перечитывает только один запрос, остальные ждут его результат
+        with self._refresh_lock:
+            if self._is_fresh():
+                return True
+            return self.refresh()
+
+    def search(
+        self,
+        city: Optional[int] = None,
+        limit: int = 20,
+        **filters,
+    ) -> Tuple[List[PartyRow], bool]:
+        """Возвращает (страница, есть_ли_еще)"""
+        source = self._by_city.get(city, []) if city is not None else self._all
+        # Списки отсортированы по sort_key: начинаем сразу после курсора и после
+        # вечеринок, начавшихся с момента загрузки индекса (они уже не предстоящие)
+        start = bisect_right(source, db_clock.now(), key=lambda p: p.start_party)
+        after = filters.get("after")
+        if after is not None:
+            start = max(start, bisect_right(source, after, key=lambda p: p.sort_key))
+        page: List[PartyRow] = []
+        for party in itertools.islice(source, start, None):
+            if not matches(party, **filters):
+                continue
+            if len(page) == limit:
+                return page, True
+            page.append(party)
+        return page, False
+
+
+# Общие экземпляры для main.py
+db_clock = DbClock()
+upcoming_parties_index = UpcomingPartiesIndex(
+    ttl=int(os.getenv("PARTY_INDEX_TTL", "30"))
+)
@@ -0,0 +1,110 @@
+"""
+SQL-ЗАПРОСЫ ОБРАБОТЧИКОВ
+Один источник текста запросов для main.py, кэшей и verify_plans.py:
+планы снимаются ровно для того SQL, который выполняет API.
+Запрос поиска вечеринок собирается в party_index.py (party_search_query).
+"""
+
+# ---------- Служебные ----------
+SELECT_VERSION = "SELECT @@version"
+
+SELECT_TABLES = """
+    SELECT TABLE_NAME
+    FROM INFORMATION_SCHEMA.TABLES
+    WHERE TABLE_TYPE = 'BASE TABLE'
+    ORDER BY TABLE_NAME
+"""
+
+SELECT_COLUMNS = """
+    SELECT c.TABLE_NAME, c.COLUMN_NAME
+    FROM INFORMATION_SCHEMA.COLUMNS c
+    JOIN INFORMATION_SCHEMA.TABLES t
+      ON t.TABLE_NAME = c.TABLE_NAME AND t.TABLE_SCHEMA = c.TABLE_SCHEMA
+    WHERE t.TABLE_TYPE = 'BASE TABLE'
+"""
+
+SELECT_DB_CLOCK = "SELECT GETDATE(), DATEDIFF(minute, GETUTCDATE(), GETDATE())"
+
+# ---------- Пользователи ----------
+COUNT_USERS = "SELECT COUNT(*) FROM users"
+
+SELECT_USER_BY_NICKNAME_OR_MAIL = """
+    SELECT ID FROM users
+    WHERE nickname = ? OR mail = ?
+"""
+
+SELECT_USER_BY_REFER = """
+    SELECT ID FROM users WHERE refer = ?
+"""
+
+INSERT_USER = """
+    INSERT INTO users (
+        nickname, surname, name, age, is_verificated, is_ban,
+        phone_number, mail, refer, refer_from, gender, invited_count
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SELECT_LAST_IDENTITY = "SELECT @@IDENTITY"
+
+INCREMENT_INVITED_COUNT = """
+    UPDATE users
+    SET invited_count = ISNULL(invited_count, 0) + 1
+    WHERE ID = ?
+"""
+
+# Используем CAST для поля name в таблице roles
+SELECT_USERS_PAGE = """
+    SELECT
+        u.ID, u.nickname, u.name, u.surname, u.mail, u.refer,
+        CAST(r.name AS NVARCHAR(255)) as current_rank,
+        ISNULL(u.invited_count, 0) as invited_count
+    FROM users u
+    LEFT JOIN user_role ur ON u.ID = ur.id_user
+    LEFT JOIN roles r ON ur.id_role = r.ID
+    ORDER BY u.ID DESC
+    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+"""
+
+# ---------- Роли ----------
+SELECT_ROLES = "SELECT ID, CAST(name AS NVARCHAR(255)) FROM roles"
+
+SELECT_ROLE_BY_NAME = "SELECT ID FROM roles WHERE name = ?"
+
+INSERT_USER_ROLE = """
+    INSERT INTO user_role (id_user, id_role)
+    VALUES (?, ?)
+"""
+
+# Когда кэш справочников не загружен и наличие user_role неизвестно
+INSERT_USER_ROLE_IF_TABLE_EXISTS = """
+    IF OBJECT_ID('user_role', 'U') IS NOT NULL
+    BEGIN
+        INSERT INTO user_role (id_user, id_role)
+        VALUES (?, ?)
+    END
+"""
+
+# ---------- Вечеринки ----------
+SELECT_PARTIES_UPCOMING = """
+    SELECT
+        ID, name, cost, location,
+        CONVERT(VARCHAR, start_party, 104) as date,
+        CONVERT(VARCHAR, start_party, 108) as time,
+        count_seats
+    FROM parties
+    WHERE start_party > GETDATE()
+    ORDER BY start_party ASC
+"""
+
+SELECT_PARTIES_ALL = """
+    SELECT
+        ID, name, cost, location,
+        CONVERT(VARCHAR, start_party, 104) as date,
+        CONVERT(VARCHAR, start_party, 108) as time,
+        count_seats
+    FROM parties
+    ORDER BY start_party DESC
+"""
+
+SELECT_PARTY_CITIES = "SELECT DISTINCT id_city FROM parties WHERE id_city IS NOT NULL"
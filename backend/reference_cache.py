@@ -0,0 +1,183 @@
+"""
+КЭШ СПРАВОЧНЫХ ДАННЫХ
+Роли, города и метаданные схемы (таблицы/колонки) загружаются один раз
+при старте и обновляются по таймеру или по сигналу администратора.
+"""
+
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional
+
+from db_config import get_db_connection
+import queries
+from logging_config import get_logger
+
+
+logger = get_logger("reference_cache")
+
+
+@dataclass(frozen=True)
+class ReferenceSnapshot:
+    """Неизменяемый снимок справочных данных"""
+
+    roles: Dict[str, int] = field(default_factory=dict)
+    cities: FrozenSet[int] = frozenset()
+    tables: List[str] = field(default_factory=list)
+    columns: Dict[str, FrozenSet[str]] = field(default_factory=dict)
+    loaded_at: Optional[float] = None
+
+
+class ReferenceCache:
+    """Кэш справочников с фоновым обновлением"""
+
+    def __init__(self, refresh_interval: int = 300, retry_interval: int = 30):
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._snapshot = ReferenceSnapshot()
+        self._table_keys: FrozenSet[str] = frozenset()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- Загрузка ----------
+    def refresh(self) -> bool:
+        """Перечитывает справочники из БД. Возвращает True при успехе."""
+        conn = get_db_connection()
+        if not conn:
+            # Оставляем предыдущий снимок, чтобы не ломать обработчики
+            return False
+
+        try:
+            cursor = conn.cursor()
+
+            # 1. Схема: таблицы и их колонки
+            cursor.execute(queries.SELECT_TABLES)
+            tables = [row[0] for row in cursor.fetchall()]
+            table_keys = frozenset(t.lower() for t in tables)
+
+            cursor.execute(queries.SELECT_COLUMNS)
+            columns: Dict[str, set] = {}
+            for table_name, column_name in cursor.fetchall():
+                columns.setdefault(table_name.lower(), set()).add(column_name.lower())
+
+            # 2. Роли (name хранится как TEXT в старых схемах, поэтому CAST)
+            roles: Dict[str, int] = {}
+            if 'roles' in table_keys:
+                cursor.execute(queries.SELECT_ROLES)
+                for role_id, role_name in cursor.fetchall():
+                    if role_name:
+                        roles[role_name.strip()] = role_id
+
+            # 3. Города, в которых есть вечеринки (parties.id_city)
+            cities: FrozenSet[int] = frozenset()
+            if 'parties' in table_keys:
+                cursor.execute(queries.SELECT_PARTY_CITIES)
+                cities = frozenset(row[0] for row in cursor.fetchall())
+
+            snapshot = ReferenceSnapshot(
+                roles=roles,
+                cities=cities,
+                tables=tables,
+                columns={k: frozenset(v) for k, v in columns.items()},
+                loaded_at=time.time(),
+            )
+            with self._lock:
+                self._snapshot = snapshot
+                self._table_keys = table_keys
+            return True
+
+        except Exception as e:
+            logger.warning("Ошибка обновления справочников: %s", e)
+            return False
+        finally:
+            conn.close()
+
+    # ---------- Фоновое обновление ----------
+    def start(self):
+        """Первичная загрузка и запуск фонового обновления"""
+        self.refresh()
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="reference-cache", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Остановка фонового обновления"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        # Пока справочники не загружены, повторяем чаще; обработчики в это время
+        # работают напрямую с БД, как до появления кэша
+        while True:
+            if self.is_loaded:
+                if self.refresh_interval <= 0:
+                    return
+                delay = self.refresh_interval
+            else:
+                delay = self.retry_interval
+            if self._stop.wait(delay):
+                return
+            self.refresh()
+
+    def install_signal_handler(self, signum: Optional[int] = None):
+        """Обновление по сигналу (по умолчанию SIGHUP, только POSIX)"""
+        if signum is None:
+            signum = getattr(signal, "SIGHUP", None)
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return
+        # Перечитываем в отдельном потоке, чтобы не блокировать обработчик сигнала
+        signal.signal(
+            signum,
+            lambda *_: threading.Thread(target=self.refresh, daemon=True).start(),
+        )
+
+    # ---------- Типизированные запросы ----------
+    @property
+    def is_loaded(self) -> bool:
+        return self._snapshot.loaded_at is not None
+
+    def role_id(self, name: str) -> Optional[int]:
+        """ID роли по названию"""
+        return self._snapshot.roles.get(name)
+
+    def tables(self) -> List[str]:
+        return list(self._snapshot.tables)
+
+    def table_exists(self, table: str) -> bool:
+        return table.lower() in self._table_keys
+
+    def column_exists(self, table: str, column: str) -> bool:
+        return column.lower() in self._snapshot.columns.get(table.lower(), frozenset())
+
+    def info(self) -> dict:
+        """Краткая сводка для эндпоинтов"""
+        snapshot = self._snapshot
+        return {
+            "loaded_at": (
+                datetime.fromtimestamp(snapshot.loaded_at).isoformat()
+                if snapshot.loaded_at else None
+            ),
+            "refresh_interval": self.refresh_interval,
+            "retry_interval": self.retry_interval,
+            "roles": len(snapshot.roles),
+            "cities": len(snapshot.cities),
+            "tables": len(snapshot.tables),
+            "columns": sum(len(c) for c in snapshot.columns.values()),
+        }
+
+
+# Общий экземпляр для main.py
+reference_cache = ReferenceCache(
+    refresh_interval=int(os.getenv("REFERENCE_CACHE_REFRESH", "300")),
+    retry_interval=int(os.getenv("REFERENCE_CACHE_RETRY", "30"))
+)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+"""
+ГЕНЕРАТОР ТЕСТОВЫХ ДАННЫХ ДЛЯ НАГРУЗОЧНОГО ТЕСТИРОВАНИЯ
+Пользователи (с реферальными цепочками), вечеринки, билеты и скидки
+в нужном масштабе. Строки генерируются потоком и вставляются пачками
+через fast_executemany; некластеризованные индексы на время загрузки
+отключаются и перестраиваются в конце.
+
+Запуск:
+    python seed_data.py --users 5000000 --parties 2000 --seed 42
+
+Одинаковые --seed и --base-date дают одинаковые данные.
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from db_config import get_db_connection
+
+# ============== СЛОВАРИ ==============
+MALE_NAMES = ["Александр", "Дмитрий", "Максим", "Иван", "Артем", "Никита", "Михаил", "Роман", "Егор", "Кирилл"]
+FEMALE_NAMES = ["Анна", "Мария", "Елена", "Дарья", "Алина", "Ксения", "Полина", "Карина", "Виктория", "София"]
+SURNAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Федоров"]
+NICK_PARTS = ["party", "night", "dance", "vibe", "club", "beat", "star", "neon", "bass", "groove"]
+PARTY_NAMES = ["Новогодняя ночь", "Рождественский бал", "Зимний фестиваль", "Neon Party", "Techno Night",
+               "Retro Disco", "Белая вечеринка", "Караоке-баттл", "Студенческая ночь", "Open Air"]
+LOCATIONS = ['Клуб "Ледниковый"', 'Ресторан "Сибирь"', 'Бар "У камина"', 'Лофт "Завод"', 'Клуб "Подвал"']
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+DISCOUNTS = [5, 10, 15, 20]
+
+# Отсчет для кодов: дата кода = REFER_EPOCH + ID секунд, поэтому код зависит только от ID
+REFER_EPOCH = datetime(2020, 1, 1)
+
+
+# ============== ГЕНЕРАТОРЫ ==============
+def referral_code(user_id: int) -> str:
+    """Формат как в generate_referral_code; у каждого ID своя секунда, поэтому коды
+    уникальны и между запусками (повторный запуск продолжает с MAX(ID) + 1)"""
+    letters = LETTERS[user_id // len(LETTERS) % len(LETTERS)] + LETTERS[user_id % len(LETTERS)]
+    return (REFER_EPOCH + timedelta(seconds=user_id)).strftime("%d%m%Y%H%M%S") + letters
+
+
+def generate_users(rng: random.Random, count: int, first_id: int,
+                   referral_rate: float) -> Iterator[tuple]:
+    """Пользователи; refer_from ссылается на код одного из предыдущих пользователей"""
+    # Коды вычисляются по ID, поэтому их не нужно держать в памяти
+    for i in range(count):
+        user_id = first_id + i
+        gender = rng.randint(0, 1)
+        name = rng.choice(MALE_NAMES if gender else FEMALE_NAMES)
+        surname = SURNAMES[rng.randrange(len(SURNAMES))] + ("" if gender else "а")
+        nickname = f"{rng.choice(NICK_PARTS)}_{user_id}"
+        refer_from = None
+        if i and rng.random() < referral_rate:
+            # Недавние пользователи приглашают чаще - получаются цепочки, а не звезда
+            refer_from = referral_code(first_id + int(i * (1 - rng.random() ** 2)))
+        yield (
+            user_id, nickname, surname, name, rng.randint(18, 45),
+            int(rng.random() < 0.7), int(rng.random() < 0.01),
+            f"89{rng.randint(0, 999999999):09d}", f"{nickname}@example.com",
+            referral_code(user_id), refer_from, gender, 0,
+        )
+
+
+def generate_parties(rng: random.Random, count: int, first_id: int, base_date: datetime,
+                     cities: int) -> List[tuple]:
+    """Вечеринки за последний год и на три месяца вперед"""
+    parties = []
+    for i in range(count):
+        start_party = base_date + timedelta(days=rng.randint(-365, 90), hours=rng.choice([19, 20, 21, 22]))
+        parties.append((
+            first_id + i,
+            f"{rng.choice(PARTY_NAMES)} #{first_id + i}",
+            rng.randrange(1000, 5001, 100),
+            rng.choice(LOCATIONS),
+            start_party,
+            start_party - timedelta(days=rng.randint(10, 60)),
+            rng.randrange(50, 501, 10),
+            rng.randint(1, cities),
+        ))
+    return parties
+
+
+def generate_tickets_and_discounts(rng: random.Random, parties: Sequence[tuple], user_ids: Tuple[int, int],
+                                   base_date: datetime, fill_rate: float,
+                                   discount_rate: float, discounts: list) -> Iterator[tuple]:
+    """Билеты по вечеринкам; часть покупателей попутно получает скидку (складывается в discounts)"""
+    first_user, last_user = user_ids
+    for party_id, _, _, _, start_party, create_party, count_seats, _ in parties:
+        sold = int(count_seats * fill_rate * rng.random() * 2)
+        sold = min(sold, count_seats)
+        sale_window = max(int((min(start_party, base_date) - create_party).total_seconds()), 1)
+        for _ in range(sold):
+            user_id = rng.randint(first_user, last_user)
+            yield (user_id, party_id, create_party + timedelta(seconds=rng.randrange(sale_window)))
+            if rng.random() < discount_rate:
+                discounts.append((rng.choice(DISCOUNTS), user_id, party_id))
+
+
+# ============== ЗАГРУЗКА ==============
+def batched(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_insert(conn, table: str, columns: Sequence[str], rows: Iterable[tuple],
+                batch_size: int, identity_insert: bool = False) -> int:
+    """Пачечная вставка с fast_executemany, печатает скорость в строках/сек"""
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+    if identity_insert:
+        cursor.execute(f"SET IDENTITY_INSERT {table} ON")
+
+    total = 0
+    started = time.perf_counter()
+    try:
+        for batch in batched(rows, batch_size):
+            cursor.executemany(query, batch)
+            conn.commit()
+            total += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"   • {table}: {total:,} строк, {total / elapsed:,.0f} строк/сек", end="\r")
+    finally:
+        if identity_insert:
+            cursor.execute(f"SET IDENTITY_INSERT {table} OFF")
+
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed else 0
+    print(f"   ✅ {table}: {total:,} строк за {elapsed:.1f} c ({rate:,.0f} строк/сек)" + " " * 10)
+    return total
+
+
+def next_id(cursor, table: str) -> int:
+    cursor.execute(f"SELECT ISNULL(MAX(ID), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def has_identity(cursor, table: str) -> bool:
+    cursor.execute("SELECT OBJECTPROPERTY(OBJECT_ID(?), 'TableHasIdentity')", (table,))
+    return bool(cursor.fetchone()[0])
+
+
+def nonclustered_indexes(cursor, table: str) -> List[str]:
+    """Некластеризованные неуникальные индексы.
+
+    Уникальные (UX_users_refer и т.п.) остаются включенными: иначе дубликаты
+    загрузятся без ошибок и сломают перестройку в конце.
+    """
+    cursor.execute("""
+        SELECT name FROM sys.indexes
+        WHERE object_id = OBJECT_ID(?) AND type_desc = 'NONCLUSTERED'
+          AND is_primary_key = 0 AND is_unique = 0 AND is_disabled = 0
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def set_indexes(conn, indexes: Sequence[Tuple[str, str]], action: str) -> List[Tuple[str, str]]:
+    """action = DISABLE или REBUILD; каждый индекс отдельно.
+
+    Возвращает индексы, для которых операция прошла успешно; ошибки печатаются.
+    """
+    cursor = conn.cursor()
+    done = []
+    for table, index in indexes:
+        started = time.perf_counter()
+        try:
+            cursor.execute(f"ALTER INDEX [{index}] ON {table} {action}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"   ❌ {table}.{index}: {action} не выполнен: {e}")
+            continue
+        done.append((table, index))
+        if action == "REBUILD":
+            print(f"   🔧 {table}.{index}: перестроен за {time.perf_counter() - started:.1f} c")
+    return done
+
+
+def update_invited_counts(conn):
+    """invited_count пригласивших - одним запросом после загрузки"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE u SET invited_count = c.cnt
+        FROM users u
+        JOIN (
+            SELECT refer_from, COUNT(*) AS cnt
+            FROM users WHERE refer_from IS NOT NULL
+            GROUP BY refer_from
+        ) c ON c.refer_from = u.refer
+    """)
+    conn.commit()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация тестовых данных Need for Party")
+    parser.add_argument("--users", type=int, default=100_000, help="количество пользователей")
+    parser.add_argument("--parties", type=int, default=500, help="количество вечеринок")
+    parser.add_argument("--cities", type=int, default=10, help="количество городов (id_city 1..N)")
+    parser.add_argument("--fill-rate", type=float, default=0.5, help="средняя заполненность вечеринок 0..1")
+    parser.add_argument("--referral-rate", type=float, default=0.3, help="доля пользователей, пришедших по приглашению")
+    parser.add_argument("--discount-rate", type=float, default=0.05, help="доля билетов со скидкой")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="строк в одной пачке")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора случайных чисел")
+    parser.add_argument("--base-date", type=datetime.fromisoformat,
+                        default=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help="опорная дата, YYYY-MM-DD (по умолчанию - сегодня)")
+    parser.add_argument("--keep-indexes", action="store_true", help="не отключать индексы на время загрузки")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    print("=" * 60)
+    print("🌱 ГЕНЕРАЦИЯ ТЕСТОВЫХ ДАННЫХ")
+    print(f"   Пользователей: {args.users:,}, вечеринок: {args.parties:,}, seed: {args.seed}")
+    print(f"   Опорная дата: {args.base_date:%Y-%m-%d}")
+    print("=" * 60)
+
+    conn = get_db_connection()
+    if not conn:
+        print("❌ Не удалось подключиться к БД")
+        return 1
+
+    started = time.perf_counter()
+    disabled: List[Tuple[str, str]] = []
+    failed = False
+    try:
+        cursor = conn.cursor()
+        first_user = next_id(cursor, "users")
+        first_party = next_id(cursor, "parties")
+
+        # 1. Отключаем некластеризованные индексы
+        if not args.keep_indexes:
+            candidates = [
+                (table, index)
+                for table in ("users", "parties", "tickets", "discounts")
+                for index in nonclustered_indexes(cursor, table)
+            ]
+            disabled = set_indexes(conn, candidates, "DISABLE")
+            print(f"\n⏸️  Отключено индексов: {len(disabled)}")
+
+        total = 0
+
+        # 2. Пользователи
+        print("\n👥 Пользователи...")
+        total += bulk_insert(
+            conn, "users",
+            ["ID", "nickname", "surname", "name", "age", "is_verificated", "is_ban",
+             "phone_number", "mail", "refer", "refer_from", "gender", "invited_count"],
+            generate_users(rng, args.users, first_user, args.referral_rate),
+            args.batch_size, identity_insert=has_identity(cursor, "users"),
+        )
+        update_invited_counts(conn)
+
+        # 3. Вечеринки
+        print("\n🎉 Вечеринки...")
+        parties = generate_parties(rng, args.parties, first_party, args.base_date, args.cities)
+        total += bulk_insert(
+            conn, "parties",
+            ["ID", "name", "cost", "location", "start_party", "create_party", "count_seats", "id_city"],
+            parties, args.batch_size, identity_insert=has_identity(cursor, "parties"),
+        )
+
+        # 4. Билеты и скидки
+        print("\n🎫 Билеты...")
+        discounts: List[tuple] = []
+        total += bulk_insert(
+            conn, "tickets", ["id_user", "id_party", "date_sale"],
+            generate_tickets_and_discounts(
+                rng, parties, (first_user, first_user + args.users - 1),
+                args.base_date, args.fill_rate, args.discount_rate, discounts,
+            ),
+            args.batch_size,
+        )
+
+        print("\n💸 Скидки...")
+        total += bulk_insert(conn, "discounts", ["discount", "id_user", "id_party"], discounts, args.batch_size)
+
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Ошибка генерации: {e}")
+        failed = True
+    finally:
+        # 5. Перестраиваем индексы даже после ошибки, иначе таблицы останутся без них
+        try:
+            if disabled:
+                print("\n🔧 Перестройка индексов...")
+                rebuilt = set_indexes(conn, disabled, "REBUILD")
+                not_rebuilt = [f"{t}.{i}" for t, i in disabled if (t, i) not in rebuilt]
+                if not_rebuilt:
+                    print(f"\n⚠️  Остались отключенными: {', '.join(not_rebuilt)}")
+                    failed = True
+        finally:
+            conn.close()
+
+    if failed:
+        return 1
+
+    elapsed = time.perf_counter() - started
+    print(f"\n{'='*60}")
+    print(f"🎉 Готово: {total:,} строк за {elapsed:.1f} c ({total / elapsed:,.0f} строк/сек)")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n👋 Генерация прервана пользователем")
+        sys.exit(1)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+ПРОВЕРКА ПЛАНОВ ЗАПРОСОВ
+Снимает план выполнения и время для каждого запроса из main.py (и кэшей,
+которые он использует). Текст запросов берется из queries.py и party_index.py,
+т.е. ровно тот, что выполняет API. Все запросы выполняются с
+SET STATISTICS XML ON (фактический план); изменяющие - в транзакции,
+которая откатывается после каждого прогона (данные не меняются, но
+значения IDENTITY расходуются).
+
+Запуск:
+    python verify_plans.py --output plans_before.json
+    python verify_plans.py --output plans_after.json --compare plans_before.json
+
+migrate.py up --verify вызывает это до и после каждой миграции.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from db_config import get_db_connection
+import queries
+from party_index import party_search_conditions, party_search_query
+
+SHOWPLAN_NS = {"sp": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+
+# limit по умолчанию в /api/parties/search; запрос берет на строку больше
+SEARCH_LIMIT = 20
+
+
+@dataclass(frozen=True)
+class Statement:
+    """Запрос из main.py; params получает словарь примеров из БД"""
+
+    name: str
+    sql: str
+    params: Callable[[dict], tuple] = lambda sample: ()
+    writes: bool = False
+
+
+def search_statement(name: str, filters: Callable[[dict], dict]) -> Statement:
+    """Вариант /api/parties/search: SQL и параметры собирает тот же код, что в main.py"""
+    # Текст условий зависит только от того, какие фильтры заданы, поэтому
+    # SQL строим по примеру по умолчанию, а параметры - по реальному
+    conditions, _ = party_search_conditions(**filters(DEFAULT_SAMPLE))
+    return Statement(
+        name,
+        party_search_query(conditions, top=True),
+        lambda sample: (SEARCH_LIMIT + 1, *party_search_conditions(**filters(sample))[1]),
+    )
+
+
+def _date_range(s: dict) -> dict:
+    return {"date_from": s["start_party"] - timedelta(days=30), "date_to": s["start_party"] + timedelta(days=30)}
+
+
+DEFAULT_SAMPLE = {
+    "nickname": "plan_check", "mail": "plan_check@example.com",
+    "refer": "00000000000000ZZ", "user_id": 0, "role_id": 0,
+    "city_id": 1, "start_party": datetime(2000, 1, 1),
+}
+
+# Запросы в том виде, в каком их выполняют обработчики
+STATEMENTS: List[Statement] = [
+    Statement("health.version", queries.SELECT_VERSION),
+    Statement("test_db.tables", queries.SELECT_TABLES),
+    Statement("test_db.user_count", queries.COUNT_USERS),
+    Statement(
+        "register.check_unique",
+        queries.SELECT_USER_BY_NICKNAME_OR_MAIL,
+        lambda s: (s["nickname"], s["mail"]),
+    ),
+    Statement("register.find_referrer", queries.SELECT_USER_BY_REFER, lambda s: (s["refer"],)),
+    Statement(
+        "register.insert_user",
+        queries.INSERT_USER,
+        lambda s: ("plan_check", "Проверка", "План", 18, 0, 0, None,
+                   "plan_check@example.com", "00000000000000ZZ", s["refer"], 1, 0),
+        writes=True,
+    ),
+    Statement("register.last_identity", queries.SELECT_LAST_IDENTITY),
+    Statement("register.role_by_name", queries.SELECT_ROLE_BY_NAME, lambda s: ("Участник",)),
+    Statement(
+        "register.insert_user_role",
+        queries.INSERT_USER_ROLE,
+        lambda s: (s["user_id"], s["role_id"]),
+        writes=True,
+    ),
+    Statement(
+        "register.insert_user_role_if_exists",
+        queries.INSERT_USER_ROLE_IF_TABLE_EXISTS,
+        lambda s: (s["user_id"], s["role_id"]),
+        writes=True,
+    ),
+    Statement(
+        "register.increment_invited",
+        queries.INCREMENT_INVITED_COUNT,
+        lambda s: (s["user_id"],),
+        writes=True,
+    ),
+    Statement("users.list", queries.SELECT_USERS_PAGE, lambda s: (0, 10)),
+    Statement("parties.upcoming", queries.SELECT_PARTIES_UPCOMING),
+    Statement("parties.all", queries.SELECT_PARTIES_ALL),
+    search_statement("parties.search_upcoming", lambda s: {}),
+    search_statement("parties.search_city", lambda s: {"city": s["city_id"]}),
+    search_statement("parties.search_city_available", lambda s: {"city": s["city_id"], "available": True}),
+    search_statement("parties.search_date_range", lambda s: {"upcoming": False, **_date_range(s)}),
+    search_statement("parties.search_price_range", lambda s: {"upcoming": False, "price_min": 1000, "price_max": 3000}),
+    search_statement("parties.search_all_filters", lambda s: {
+        "upcoming": False, "city": s["city_id"], "price_min": 1000, "price_max": 3000,
+        "available": True, **_date_range(s),
+    }),
+    search_statement("parties.search_next_page", lambda s: {
+        "upcoming": False, "available": True, "after": (s["start_party"], 0),
+    }),
+    Statement("party_index.db_clock", queries.SELECT_DB_CLOCK),
+    Statement("reference_cache.columns", queries.SELECT_COLUMNS),
+    Statement("reference_cache.roles", queries.SELECT_ROLES),
+    Statement("reference_cache.cities", queries.SELECT_PARTY_CITIES),
+]
+
+
+def load_sample(cursor) -> dict:
+    """Реальные значения параметров, чтобы планы соответствовали живым запросам"""
+    sample = dict(DEFAULT_SAMPLE)
+    cursor.execute("SELECT TOP 1 ID, nickname, mail, refer FROM users WHERE refer IS NOT NULL ORDER BY ID DESC")
+    row = cursor.fetchone()
+    if row:
+        sample.update(user_id=row[0], nickname=row[1], mail=row[2], refer=row[3])
+    cursor.execute("SELECT TOP 1 ID FROM roles")
+    row = cursor.fetchone()
+    if row:
+        sample["role_id"] = row[0]
+    cursor.execute("SELECT TOP 1 id_city, start_party FROM parties WHERE id_city IS NOT NULL ORDER BY start_party")
+    row = cursor.fetchone()
+    if row:
+        sample.update(city_id=row[0], start_party=row[1])
+    return sample
+
+
+def summarize_plan(plan_xml: str) -> dict:
+    """Операторы, индексы и оценочная стоимость из ShowPlanXML"""
+    root = ET.fromstring(plan_xml)
+    operators = []
+    indexes = set()
+    for rel_op in root.iterfind(".//sp:RelOp", SHOWPLAN_NS):
+        operators.append(rel_op.get("PhysicalOp"))
+    for obj in root.iterfind(".//sp:Object", SHOWPLAN_NS):
+        if obj.get("Index"):
+            indexes.add(f"{obj.get('Table', '').strip('[]')}.{obj.get('Index').strip('[]')}")
+    statement = root.find(".//sp:StmtSimple", SHOWPLAN_NS)
+    cost = float(statement.get("StatementSubTreeCost", 0)) if statement is not None else None
+    return {
+        "operators": operators,
+        "indexes": sorted(indexes),
+        "estimated_cost": cost,
+        "scans": sum(op in ("Table Scan", "Clustered Index Scan", "Index Scan") for op in operators),
+    }
+
+
+def _plan_from_results(cursor) -> Optional[str]:
+    """Пролистывает результаты до набора с планом"""
+    while True:
+        if cursor.description:
+            for row in cursor.fetchall():
+                value = row[0]
+                if isinstance(value, str) and value.startswith("<ShowPlanXML"):
+                    return value
+        if not cursor.nextset():
+            return None
+
+
+def _execute_all(cursor, statement: Statement, params: tuple) -> Optional[str]:
+    """Выполняет запрос, пролистывает все результаты; возвращает план, если он есть"""
+    cursor.execute(statement.sql, params)
+    return _plan_from_results(cursor)
+
+
+def capture_statement(conn, statement: Statement, sample: dict, runs: int) -> dict:
+    cursor = conn.cursor()
+    params = statement.params(sample)
+    result = {"name": statement.name, "writes": statement.writes}
+    # Изменяющие запросы выполняются по-настоящему и откатываются после
+    # каждого прогона: нужна открытая транзакция, т.е. autocommit выключен
+    autocommit = conn.autocommit
+    if statement.writes:
+        conn.autocommit = False
+    try:
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            _execute_all(cursor, statement, params)
+            timings.append((time.perf_counter() - started) * 1000)
+            if statement.writes:
+                conn.rollback()
+        result["median_ms"] = round(statistics.median(timings), 3)
+        result["max_ms"] = round(max(timings), 3)
+
+        cursor.execute("SET STATISTICS XML ON")
+        try:
+            plan = _execute_all(cursor, statement, params)
+        finally:
+            cursor.execute("SET STATISTICS XML OFF")
+            if statement.writes:
+                conn.rollback()
+
+        result["plan"] = summarize_plan(plan) if plan else None
+    except Exception as e:
+        conn.rollback()
+        result["error"] = str(e)
+    finally:
+        conn.autocommit = autocommit
+    return result
+
+
+def capture_plans(conn, runs: int = 5, label: str = "") -> dict:
+    """План и время для всех запросов из STATEMENTS"""
+    sample = load_sample(conn.cursor())
+    return {
+        "label": label,
+        "captured_at": datetime.now().isoformat(),
+        "statements": {
+            statement.name: capture_statement(conn, statement, sample, runs)
+            for statement in STATEMENTS
+        },
+    }
+
+
+def compare_reports(before: dict, after: dict) -> List[str]:
+    """Человекочитаемые различия между двумя снимками"""
+    lines = []
+    for name, new in after["statements"].items():
+        old = before["statements"].get(name)
+        if not old or not old.get("plan") or not new.get("plan"):
+            continue
+        changes = []
+        if old["plan"]["indexes"] != new["plan"]["indexes"]:
+            changes.append(f"индексы {old['plan']['indexes']} -> {new['plan']['indexes']}")
+        if old["plan"]["scans"] != new["plan"]["scans"]:
+            changes.append(f"сканов {old['plan']['scans']} -> {new['plan']['scans']}")
+        old_cost, new_cost = old["plan"]["estimated_cost"], new["plan"]["estimated_cost"]
+        if old_cost is not None and new_cost is not None and old_cost != new_cost:
+            changes.append(f"стоимость {old_cost:.4f} -> {new_cost:.4f}")
+        if "median_ms" in old and "median_ms" in new:
+            changes.append(f"время {old['median_ms']} -> {new['median_ms']} мс")
+        if changes:
+            lines.append(f"   • {name}: " + "; ".join(changes))
+    return lines
+
+
+def print_report(report: dict):
+    for name, result in report["statements"].items():
+        if "error" in result:
+            print(f"   ❌ {name}: {result['error'][:100]}")
+            continue
+        plan = result.get("plan") or {}
+        print(f"   • {name:<32} {result['median_ms']:>9.3f} мс  сканов: {plan.get('scans', '?')}  "
+              f"индексы: {', '.join(plan.get('indexes', [])) or '-'}")
+
+
+def save_report(report: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Планы и время запросов из main.py")
+    parser.add_argument("--runs", type=int, default=5, help="повторов для замера времени")
+    parser.add_argument("--output", help="сохранить снимок в JSON")
+    parser.add_argument("--compare", help="сравнить с ранее сохраненным снимком")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    if not conn:
+        print("❌ Не удалось подключиться к БД")
+        return 1
+    try:
+        report = capture_plans(conn, args.runs)
+    finally:
+        conn.close()
+
+    print("🔍 Планы запросов:")
+    print_report(report)
+    if args.output:
+        save_report(report, args.output)
+        print(f"\n📁 Снимок сохранен: {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before: Dict = json.load(f)
+        print(f"\n📊 Изменения относительно {args.compare}:")
+        print("\n".join(compare_reports(before, report)) or "   нет изменений")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
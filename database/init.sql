@@ -1,10 +1,8 @@
 USE need_for_party;
 
--- 1. Исправление таблицы roles (если нужно)
-IF EXISTS (SELECT * FROM sys.columns WHERE object_id = OBJECT_ID('roles') AND name = 'name')
-BEGIN
-    ALTER TABLE roles ALTER COLUMN name NVARCHAR(255) NOT NULL;
-END
+-- 1. Схема и индексы - через миграции, до этого скрипта:
+--    python backend/migrate.py up
+--    (тип roles.name исправляет database/migrations/002_roles_name_nvarchar.sql)
 
 -- 2. Добавление тестовых вечеринок
 IF NOT EXISTS (SELECT 1 FROM parties WHERE name LIKE '%Новогодняя%')
@@ -22,29 +20,26 @@ BEGIN
 END
 
 -- 3. Добавление тестовых билетов
+-- Одним INSERT ... SELECT вместо цикла; для больших объемов - backend/seed_data.py
 IF NOT EXISTS (SELECT 1 FROM tickets)
 BEGIN
-    -- Билеты для вечеринки 1
-    DECLARE @i INT = 1;
-    WHILE @i <= 85
-    BEGIN
-        INSERT INTO tickets (id_user, id_party, date_sale)
-        VALUES (
-            @i, 
-            1, 
-            DATEADD(day, -CAST(RAND() * 30 AS INT), GETDATE())
-        );
-        SET @i = @i + 1;
-    END;
+    -- Билеты для вечеринки 1 (NEWID вместо RAND: RAND один на весь запрос)
+    WITH numbers AS (
+        SELECT TOP (85) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS n
+        FROM sys.all_objects
+    )
+    INSERT INTO tickets (id_user, id_party, date_sale)
+    SELECT n, 1, DATEADD(day, -(ABS(CHECKSUM(NEWID())) % 30), GETDATE())
+    FROM numbers;
     
     -- Билеты для вечеринки 2
-    SET @i = 1;
-    WHILE @i <= 45
-    BEGIN
-        INSERT INTO tickets (id_user, id_party, date_sale)
-        VALUES (@i + 100, 2, DATEADD(day, -CAST(RAND() * 20 AS INT), GETDATE()));
-        SET @i = @i + 1;
-    END;
+    WITH numbers AS (
+        SELECT TOP (45) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS n
+        FROM sys.all_objects
+    )
+    INSERT INTO tickets (id_user, id_party, date_sale)
+    SELECT n + 100, 2, DATEADD(day, -(ABS(CHECKSUM(NEWID())) % 20), GETDATE())
+    FROM numbers;
 END
 
 -- 4. Добавление тестовых скидок
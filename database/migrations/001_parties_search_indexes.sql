@@ -0,0 +1,25 @@
+-- 001. Индексы для поиска вечеринок (GET /api/parties/search)
+-- Keyset-пагинация идет по (start_party, ID), фильтры - город, цена, свободные места.
+
+-- 1. Поиск по дате без города
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_parties_start_party' AND object_id = OBJECT_ID('parties'))
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_parties_start_party
+        ON parties (start_party, ID)
+        INCLUDE (name, cost, location, count_seats, id_city);
+END
+
+-- 2. Поиск по городу (основной сценарий)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_parties_city_start_party' AND object_id = OBJECT_ID('parties'))
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_parties_city_start_party
+        ON parties (id_city, start_party, ID)
+        INCLUDE (name, cost, location, count_seats);
+END
+
+-- 3. Подсчет проданных билетов для фильтра свободных мест
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tickets_id_party' AND object_id = OBJECT_ID('tickets'))
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_tickets_id_party
+        ON tickets (id_party);
+END
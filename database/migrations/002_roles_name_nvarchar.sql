@@ -0,0 +1,13 @@
+-- 002. roles.name: TEXT -> NVARCHAR(255)
+-- Раньше выполнялось в init.sql при каждом запуске. С TEXT не работают
+-- сравнение name = '...' и индексы, поэтому CAST был во всех запросах.
+
+IF EXISTS (
+    SELECT 1 FROM sys.columns c
+    JOIN sys.types t ON t.user_type_id = c.user_type_id
+    WHERE c.object_id = OBJECT_ID('roles') AND c.name = 'name'
+      AND (t.name IN ('text', 'ntext') OR c.max_length = -1)
+)
+BEGIN
+    ALTER TABLE roles ALTER COLUMN name NVARCHAR(255) NOT NULL;
+END
@@ -0,0 +1,59 @@
+-- 003. Индексы для регистрации и списка пользователей
+-- Регистрация ищет по nickname, mail и refer; refer_from нужен для пересчета
+-- invited_count; user_role.id_user - для JOIN в GET /api/users.
+-- Индекс tickets(id_party) создан в 001.
+
+-- 1. Дубликаты не дадут создать уникальные индексы - сообщаем понятной ошибкой
+IF EXISTS (SELECT nickname FROM users GROUP BY nickname HAVING COUNT(*) > 1)
+BEGIN
+    THROW 50001, N'В users есть повторяющиеся nickname - удалите дубликаты перед миграцией', 1;
+END
+
+IF EXISTS (SELECT mail FROM users WHERE mail IS NOT NULL GROUP BY mail HAVING COUNT(*) > 1)
+BEGIN
+    THROW 50002, N'В users есть повторяющиеся mail - удалите дубликаты перед миграцией', 1;
+END
+
+IF EXISTS (SELECT refer FROM users WHERE refer IS NOT NULL GROUP BY refer HAVING COUNT(*) > 1)
+BEGIN
+    THROW 50003, N'В users есть повторяющиеся refer - удалите дубликаты перед миграцией', 1;
+END
+
+-- 2. Проверка уникальности при регистрации: WHERE nickname = ? OR mail = ?
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_users_nickname' AND object_id = OBJECT_ID('users'))
+BEGIN
+    CREATE UNIQUE NONCLUSTERED INDEX UX_users_nickname
+        ON users (nickname);
+END
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_users_mail' AND object_id = OBJECT_ID('users'))
+BEGIN
+    CREATE UNIQUE NONCLUSTERED INDEX UX_users_mail
+        ON users (mail)
+        WHERE mail IS NOT NULL;
+END
+
+-- 3. Поиск пригласившего по коду: WHERE refer = ?
+-- Фильтрованный: у старых записей refer может быть NULL
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_users_refer' AND object_id = OBJECT_ID('users'))
+BEGIN
+    CREATE UNIQUE NONCLUSTERED INDEX UX_users_refer
+        ON users (refer)
+        WHERE refer IS NOT NULL;
+END
+
+-- 4. Приглашенные пользователи: refer_from -> refer
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_users_refer_from' AND object_id = OBJECT_ID('users'))
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_users_refer_from
+        ON users (refer_from)
+        WHERE refer_from IS NOT NULL;
+END
+
+-- 5. Роль пользователя в GET /api/users: покрывающий индекс для JOIN
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_user_role_id_user' AND object_id = OBJECT_ID('user_role'))
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_user_role_id_user
+        ON user_role (id_user)
+        INCLUDE (id_role);
+END